@@ -1,3 +1,5 @@
+import os
+import subprocess
 import sys
 
 import wandb
@@ -10,7 +12,21 @@ from src.utils.constants import WANDB_PROJECT, WANDB_ENTITY
 
 if __name__ == '__main__':
     args = make_and_parse_args()
+    if args.wandb_offline:
+        # Log runs locally and upload them all at the end instead of
+        # syncing with the server during every run
+        os.environ['WANDB_MODE'] = 'offline'
+
+    run_dirs = []
     for _ in range(args.n_runs):
-        wandb.init(project=WANDB_PROJECT, entity=WANDB_ENTITY, config=args)
+        # Thread start avoids launching a new wandb process for every run
+        wandb.init(project=WANDB_PROJECT, entity=WANDB_ENTITY, config=args,
+                   reinit=True, settings=wandb.Settings(start_method='thread'))
+        # wandb.run.dir is the run's files/ subdirectory
+        run_dirs.append(os.path.dirname(wandb.run.dir))
         train_loop(args)
-        wandb.finish()
\ No newline at end of file
+        wandb.finish()
+
+    if args.wandb_offline:
+        # Only sync the runs from this invocation, raises if the upload fails
+        subprocess.run(['wandb', 'sync'] + run_dirs, check=True)
@@ -58,48 +58,95 @@ class BaseRepresentationLearner(ABC):
 
 
 class ExperienceBufferMixin():
-  def __init__(self, max_size=int(1e6)):
-    self.exp_buffer = []
+  """
+  Ring buffer of transitions stored as one pre-allocated tensor per element
+  (e.g. obs, act, reward, next_obs, done). Storage is allocated lazily from
+  the first entry and grows by doubling until it reaches `max_size`.
+  """
+  def __init__(self, max_size=int(1e6), init_size=1024):
     self.max_size = max_size
-
-  def _fix_size(self):
-    self.exp_buffer = self.exp_buffer[-self.max_size:]
+    self.init_size = min(init_size, max_size)
+    self.exp_buffer = None
+    # Seeded from the global numpy state so np.random.seed still applies
+    self._buffer_rng = np.random.default_rng(np.random.randint(2 ** 31))
+    self.clear_buffer()
+
+  def _init_buffer(self, data):
+    self.exp_buffer = [torch.empty(
+        (self.init_size,) + tuple(torch.as_tensor(e).shape),
+        dtype=torch.float32) for e in data]
+
+  def _grow_buffer(self):
+    new_size = min(2 * len(self.exp_buffer[0]), self.max_size)
+    new_buffer = []
+    for buffer_data in self.exp_buffer:
+      new_data = buffer_data.new_empty((new_size,) + buffer_data.shape[1:])
+      new_data[:self.buffer_len] = buffer_data[:self.buffer_len]
+      new_buffer.append(new_data)
+    self.exp_buffer = new_buffer
 
   def clear_buffer(self):
-    self.exp_buffer = []
+    # Keep the allocated storage around so it can be reused
+    self.buffer_pos = 0
+    self.buffer_len = 0
 
   def append_buffer(self, data):
-    self.exp_buffer.append(data)
-    self._fix_size()
+    if self.exp_buffer is None:
+      self._init_buffer(data)
+    elif self.buffer_pos == len(self.exp_buffer[0]):
+      self._grow_buffer()
+
+    for buffer_data, e in zip(self.exp_buffer, data):
+      buffer_data[self.buffer_pos] = torch.as_tensor(e, dtype=buffer_data.dtype)
+    self.buffer_pos = (self.buffer_pos + 1) % self.max_size
+    self.buffer_len = min(self.buffer_len + 1, self.max_size)
 
   def extend_buffer(self, data):
-    self.exp_buffer.extend(data)
-    self._fix_size()
+    for e in data:
+      self.append_buffer(e)
+
+  def _gather_buffer(self, data_idxs, device=None):
+    # One batched gather per element instead of collecting entries in Python
+    device = None if device is None else torch.device(device)
+    buffer_device = self.exp_buffer[0].device
+    # Gathering into pinned memory lets the copy to the GPU run async
+    pin = device is not None and device.type == 'cuda' \
+      and buffer_device.type == 'cpu'
 
-  def sample_buffer(self, n, replace=False):
-    # Sample indices
-    data_idxs = np.random.choice(range(len(self.exp_buffer)),
-                                 size=n, replace=replace)
     batch_data = []
-    for i in data_idxs:
-      batch_data.append(self.exp_buffer[i])
-    # Create separate np arrays for each element
-    element_tensors = \
-      [torch.stack([torch.tensor(se, dtype=torch.float32) for se in e], \
-        dim=0) for e in zip(*batch_data)]
-
-    return element_tensors
-
-  def get_buffer_recent_data(self, n):
-    batch_data = self.exp_buffer[-n:]
-    # Create separate np arrays for each element
-    element_tensors = \
-      [torch.stack([torch.tensor(se, dtype=torch.float32) for se in e], \
-        dim=0) for e in zip(*batch_data)]
-    return element_tensors
+    for buffer_data in self.exp_buffer:
+      if pin:
+        batch = torch.empty((len(data_idxs),) + buffer_data.shape[1:],
+          dtype=buffer_data.dtype, pin_memory=True)
+        torch.index_select(buffer_data, 0, data_idxs, out=batch)
+        batch = batch.to(device, non_blocking=True)
+      else:
+        batch = buffer_data.index_select(0, data_idxs)
+        if device is not None:
+          batch = batch.to(device)
+      batch_data.append(batch)
+    return batch_data
+
+  def sample_buffer(self, n, replace=False, device=None):
+    # Sample indices
+    buffer_device = self.exp_buffer[0].device
+    if replace:
+      data_idxs = torch.randint(0, self.buffer_len, (n,), device=buffer_device)
+    else:
+      # Unlike a full permutation, this is O(n) for n << buffer size
+      data_idxs = self._buffer_rng.choice(self.buffer_len,
+        size=min(n, self.buffer_len), replace=False, shuffle=False)
+      data_idxs = torch.from_numpy(data_idxs).to(buffer_device)
+    return self._gather_buffer(data_idxs, device)
+
+  def get_buffer_recent_data(self, n, device=None):
+    n = min(n, self.buffer_len)
+    data_idxs = torch.arange(self.buffer_pos - n, self.buffer_pos,
+      device=self.exp_buffer[0].device) % len(self.exp_buffer[0])
+    return self._gather_buffer(data_idxs, device)
   
   def buffer_size(self):
-    return len(self.exp_buffer)
+    return self.buffer_len
 
 
 def create_basic_fe_model(layer_type='conv', input_dim=None):
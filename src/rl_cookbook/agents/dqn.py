@@ -5,9 +5,10 @@ from ..envs.data import RewardNormalizer
 
 import numpy as np
 import torch
-from torch import optim
+from torch import nn, optim
 from torch.distributions import Categorical
 from torch.nn import functional as F
+from torch.quantization import quantize_dynamic
 import wandb
 
 
@@ -15,7 +16,7 @@ class DDDQNAgent(BaseAgent, ExperienceBufferMixin):
   def __init__(self, env, model, calculate_rewards=None, batch_size=128,
                update_freq=1, log_freq=100, lr=3e-4, epsilon=0.05,
                gamma=0.99, n_step=12, target_update_freq=200, learning_start=1600,
-               normalize_rewards=False):
+               normalize_rewards=False, quantize_target=False):
     super().__init__()
 
     self.n_acts = env.action_space.n
@@ -30,15 +31,19 @@ class DDDQNAgent(BaseAgent, ExperienceBufferMixin):
     self.gamma = gamma
     self.n_step = n_step
     self.target_update_freq = target_update_freq # In number of updates
+    self.quantize_target = quantize_target
     self.losses = []
     self.step_idx = 1
     # Stored transitions, waiting for n_steps before adding
     # to buffer to calculate n_step rewards
     self.n_step_buffer = []
-    self._update_target_network()
 
     if calculate_rewards is not None:
       raise ValueError('calculate rewards is not yet supported for DDDQN')
+    if quantize_target and self.device.type != 'cpu':
+      raise ValueError('target network quantization is only supported on CPU')
+
+    self._update_target_network()
 
     if normalize_rewards:
       self.reward_normalizer = RewardNormalizer()
@@ -48,7 +53,13 @@ class DDDQNAgent(BaseAgent, ExperienceBufferMixin):
     self.optimizer = optim.Adam(self.model.parameters(), lr=lr)
 
   def _update_target_network(self):
-      self.target_model = copy.deepcopy(self.model)
+      if self.quantize_target:
+        # The target network is only used for inference, so int8 weights
+        # for its linear layers are enough
+        self.target_model = quantize_dynamic(
+          self.model, {nn.Linear}, dtype=torch.qint8)
+      else:
+        self.target_model = copy.deepcopy(self.model)
 
   def _gen_buffer_entry(self):
     # Input transition data format: [obs, act, reward, next_obs, done]
@@ -93,21 +104,23 @@ class DDDQNAgent(BaseAgent, ExperienceBufferMixin):
     if np.random.rand() < self.epsilon:
       return np.random.randint(0, self.n_acts)
 
-    obs = torch.tensor(obs, dtype=torch.float32, device=self.device)
+    obs = torch.as_tensor(obs, dtype=torch.float32, device=self.device)
     obs = obs.unsqueeze(0)
-    with torch.no_grad():
+    # Skips autograd's view and version tracking, which no_grad still does
+    with torch.inference_mode():
       q_vals = self.model(obs).cpu().numpy()[0]
     if (q_vals == q_vals[0]).all():
       return np.random.randint(0, self.n_acts)
     return np.argmax(q_vals)
 
   def prepare_batch_data(self):
-    if len(self.exp_buffer) < self.batch_size:
+    if self.buffer_size() < self.batch_size:
         replace = True
     else:
         replace = False
-    batch_data = self.sample_buffer(self.batch_size, replace=replace)
-    batch_data = [torch.tensor(e, dtype=torch.float32, device=self.device) \
+    batch_data = self.sample_buffer(self.batch_size, replace=replace,
+                                    device=self.device)
+    batch_data = [torch.as_tensor(e, dtype=torch.float32, device=self.device) \
        for e in batch_data]
     batch_data[1] = batch_data[1].long()
     batch_data[4] = batch_data[4].int()
@@ -22,7 +22,9 @@ class ReprLearningMixin():
 
   def train_representation(self):
     replace = (self.repr_step_idx - 1) < self.buffer_size()
-    batch_data = self.sample_buffer(self.repr_learner.batch_size, replace)
+    repr_device = next(self.repr_learner.model.parameters()).device
+    batch_data = self.sample_buffer(
+      self.repr_learner.batch_size, replace, device=repr_device)
     loss = self.repr_learner.train(batch_data)
     self.repr_losses.append(loss)
 
@@ -52,17 +52,18 @@ class PPOAgent(BaseAgent, ExperienceBufferMixin):
     if np.random.rand() < self.epsilon:
       return np.random.randint(0, self.n_acts)
 
-    obs = torch.tensor(obs, dtype=torch.float32, device=self.device)
+    obs = torch.as_tensor(obs, dtype=torch.float32, device=self.device)
     obs = obs.unsqueeze(0)
-    with torch.no_grad():
+    # Skips autograd's view and version tracking, which no_grad still does
+    with torch.inference_mode():
       logits = self.policy(obs)
-    probs = F.softmax(logits, dim=-1).cpu().numpy()[0]
+      probs = F.softmax(logits, dim=-1).cpu().numpy()[0]
     return np.random.choice(self.n_acts, p=probs)
 
   def prepare_recent_batch_data(self):
     batch_data = self.get_buffer_recent_data(self.update_freq)
     self.clear_buffer()
-    batch_data = [torch.tensor(e, dtype=torch.float32) \
+    batch_data = [torch.as_tensor(e, dtype=torch.float32) \
        for e in batch_data]
     batch_data[1] = batch_data[1].long()
     return batch_data
@@ -28,7 +28,7 @@ class NextStatePredictor(BaseRepresentationLearner):
     device = next(self.model.parameters()).device
     
     obs, acts, _, next_obs, _ = \
-      [torch.tensor(e, dtype=torch.float32).to(device) for e in batch_data]
+      [torch.as_tensor(e, dtype=torch.float32, device=device) for e in batch_data]
     oh_acts = F.one_hot(acts.long(), self.n_acts).float()
     next_obs_pred = self.model(obs, oh_acts)
     losses = (next_obs - next_obs_pred) ** 2
@@ -79,7 +79,7 @@ class SFPredictor(BaseRepresentationLearner):
 
     # Expects batch_data to be [obs, acts, rewards, next_obs, terminals]
     obs, _, _, next_obs, _ = \
-      [torch.tensor(e, dtype=torch.float32).to(device) for e in batch_data]
+      [torch.as_tensor(e, dtype=torch.float32, device=device) for e in batch_data]
     
     self.model.train()
     self.target_model.train()
@@ -1,16 +1,16 @@
+from functools import partial
+
 import gym
 from gym.wrappers import TimeLimit, TransformObservation
 import gym_gridworld
 import torch
 
 from .wrappers import GridWorldWrapper, SimpleMapWrapper
-from .wrappers import ATARI_WRAPPERS, PROCGEN_WRAPPERS, GYM_1D_WRAPPERS, N_FRAME_STACK
+from .wrappers import apply_atari_wrappers, apply_gym_1d_wrappers, apply_procgen_wrappers
+from .wrappers import N_FRAME_STACK
 
 
 def create_gridworld_env(max_steps=500):
-  global N_FRAME_STACK
-  N_FRAME_STACK = 1
-
   env = gym.make('gridworld-v0')
   env = GridWorldWrapper(env)
   env = TimeLimit(env, max_steps)
@@ -26,13 +26,9 @@ def create_simple_gridworld_env(randomized=False, max_steps=500):
 ### Atari Env ###
 
 
-def create_atari_env(env_name):
-  global N_FRAME_STACK
-  N_FRAME_STACK = 4
-
+def create_atari_env(env_name, n_stack=N_FRAME_STACK, float_obs=True):
   env = gym.make(env_name)
-  for wrapper in ATARI_WRAPPERS:
-    env = wrapper(env)
+  env = apply_atari_wrappers(env, n_stack, float_obs)
   return env
 
 def create_breakout_env():
@@ -45,16 +41,12 @@ def create_crazy_climber_env():
 ### Gym Envs ###
 
 
-def create_gym_1d_env(env_name):
+def create_gym_1d_env(env_name, n_stack=N_FRAME_STACK):
   assert env_name in SUPPORTED_GYM_1D_ENVS, \
     f'Unsupported gym 1d env: {env_name}'
 
-  global N_FRAME_STACK
-  N_FRAME_STACK = 4
-
   env = gym.make(env_name)
-  for wrapper in GYM_1D_WRAPPERS:
-    env = wrapper(env)
+  env = apply_gym_1d_wrappers(env, n_stack)
   return env
 
 SUPPORTED_GYM_1D_ENVS = set([
@@ -67,19 +59,16 @@ SUPPORTED_GYM_1D_ENVS = set([
 
 
 def create_procgen_env(env_name):
-  global N_FRAME_STACK
-  N_FRAME_STACK = 3
-
   env = gym.make(env_name)
-  for wrapper in PROCGEN_WRAPPERS:
-    env = wrapper(env)
+  env = apply_procgen_wrappers(env)
   return env
 
 
 ### General ###
 
 
-def make_env(env_name):
+# `float_obs=False` keeps Atari observations as stacked uint8 frames
+def make_env(env_name, float_obs=True):
   if 'gridworld' in env_name.lower():
     if 'random' in env_name.lower():
       return create_simple_gridworld_env(True)
@@ -90,7 +79,27 @@ def make_env(env_name):
   elif 'procgen' in env_name.lower():
     return create_procgen_env(env_name)
   else:
-    return create_atari_env(env_name)
+    return create_atari_env(env_name, float_obs=float_obs)
+
+def make_vec_env(env_name, n_envs, asynchronous=False):
+  """
+  Creates `n_envs` copies of an env batched into a single vector env.
+  Atari observations are left as stacked uint8 frames so workers pass a
+  quarter of the bytes through shared memory; scale them to [0, 1] after
+  batching.
+
+  Args:
+    env_name: name of the env, as passed to `make_env`
+    n_envs: (int) number of envs to batch
+    asynchronous: step each env in its own process instead of sequentially
+    
+  Returns:
+    env: gym.vector.VectorEnv
+  """
+  env_fns = [partial(make_env, env_name, float_obs=False) for _ in range(n_envs)]
+  if asynchronous:
+    return gym.vector.AsyncVectorEnv(env_fns, shared_memory=True)
+  return gym.vector.SyncVectorEnv(env_fns)
   
 
 # if __name__ == '__main__':
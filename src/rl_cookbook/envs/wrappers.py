@@ -1,13 +1,18 @@
-import copy
-
 import cv2
 import numpy as np
 import gym
-from gym.wrappers import AtariPreprocessing, FrameStack, TransformObservation
+from gym.wrappers import AtariPreprocessing, TransformObservation
 import torch
 
 
 N_FRAME_STACK = 4
+GRAYSCALE_WEIGHTS = np.array([0.2989, 0.5870, 0.1140], dtype=np.float32)
+
+def rgb_to_grayscale(obs):
+  # uint8 frames stay uint8, cv2 converts them with fixed-point integer math
+  if obs.dtype == np.uint8:
+    return cv2.cvtColor(obs, cv2.COLOR_RGB2GRAY)
+  return obs.astype(np.float32, copy=False) @ GRAYSCALE_WEIGHTS
 
 class NoRewardWrapper(gym.RewardWrapper):
   def __init__(self, env):
@@ -25,14 +30,23 @@ class NoTerminationWrapper(gym.Wrapper):
     return obs, reward, False, info
 
 class RandomTerminationWrapper(gym.Wrapper):
-  def __init__(self, env, termination_chance=0.01):
+  def __init__(self, env, termination_chance=0.01, buffer_size=1024):
     super().__init__(env)
     self.termination_chance = termination_chance
+    # Termination rolls are drawn in batches and refilled when used up
+    self.buffer_size = buffer_size
+    self._terminations = np.empty(buffer_size, dtype=bool)
+    self._termination_idx = buffer_size
 
   def step(self, action):
     obs, reward, done, info = self.env.step(action)
-    if np.random.random() < self.termination_chance:
+    if self._termination_idx >= self.buffer_size:
+      self._terminations[:] = \
+        np.random.random(self.buffer_size) < self.termination_chance
+      self._termination_idx = 0
+    if self._terminations[self._termination_idx]:
       done = True
+    self._termination_idx += 1
     return obs, reward, done, info
 
 class GridWorldWrapper(gym.ObservationWrapper):
@@ -41,7 +55,7 @@ class GridWorldWrapper(gym.ObservationWrapper):
 
   def observation(self, observation):
     # Convert to grayscale
-    observation = np.sum(observation * np.array([[[0.2989, 0.5870, 0.1140]]]), axis=2)
+    observation = rgb_to_grayscale(observation)
     self.formatted_obs = observation
     return observation
 
@@ -57,32 +71,36 @@ class SimpleMapWrapper(gym.ObservationWrapper):
     self.observation_space = gym.spaces.Box(
         low=0, high=1, shape=[1]+list(map_shape), dtype=np.float32)
 
+    # Empty map with walls on the border, reused as the base of every start map
+    self._map_template = np.ones(map_shape, dtype=np.int64)
+    self._map_template[1:-1, 1:-1] = 0
+    self._free_map_idxs = np.flatnonzero(self._map_template == 0)
+
     self._reset_start_map()
 
   def _reset_start_map(self):
-    map = np.ones(self.observation_space.shape[1:], dtype=np.int64)
-    map [1:-1, 1:-1] = 0
+    map = self._map_template.copy()
 
     if self.random_start:
-      max_x, max_y = np.array(self.observation_space.shape[1:]) - 1
-      map[np.random.randint(1, max_x), np.random.randint(1, max_y)] = 3
-      new_pos = (np.random.randint(1, max_x), np.random.randint(1, max_y))
-      while map[new_pos[0], new_pos[1]] == 3:
-        new_pos = (np.random.randint(1, max_x), np.random.randint(1, max_y))
-      map[new_pos[0], new_pos[1]] = 4
+      # Pick two distinct free cells for the target and agent start
+      target_idx, agent_idx = np.random.choice(
+        self._free_map_idxs, size=2, replace=False)
+      map.flat[target_idx] = 3
+      map.flat[agent_idx] = 4
     else:
       map[-3, 2] = 3
       map[-6, 4] = 4
 
     uenv = self.unwrapped
     uenv.start_grid_map = map
-    uenv.current_grid_map = copy.deepcopy(uenv.start_grid_map)  # current grid map
+    uenv.current_grid_map = uenv.start_grid_map.copy()  # current grid map
     uenv.observation = uenv._gridmap_to_observation(uenv.start_grid_map)
     uenv.grid_map_shape = uenv.start_grid_map.shape
 
     uenv.agent_start_state, uenv.agent_target_state = \
       uenv._get_agent_start_target_state(uenv.start_grid_map)
-    uenv.agent_state = copy.deepcopy(uenv.agent_start_state)
+    # The start state is a flat [row, col] list, so a shallow copy is enough
+    uenv.agent_state = list(uenv.agent_start_state)
 
   def observation(self, observation):
     # observation = cv2.resize(observation, self.observation_space.shape[1:],
@@ -109,14 +127,62 @@ class Scale1DObsWrapper(gym.ObservationWrapper):
         low=np.zeros(obs_shape), high=np.ones(obs_shape),
         shape=env.observation_space.shape, dtype=np.float32)
 
+    # Cache the range of the original observation space for scaling
+    self._obs_low = env.observation_space.low.astype(np.float32)
+    self._obs_inv_range = (1.0 / (env.observation_space.high \
+      - env.observation_space.low)).astype(np.float32)
+
   # Scales observations to [0, 1]
   def observation(self, observation):
-    observation = observation.astype(np.float32)
-    obs_space = self.observation_space
-    obs_range = obs_space.high - obs_space.low
-    observation = (observation - obs_space.low) / obs_range
+    observation = np.subtract(observation, self._obs_low, dtype=np.float32)
+    observation *= self._obs_inv_range
     return observation
 
+class FastFrameStack(gym.Wrapper):
+  """
+  Stacks the last `n_stack` observations using a ring buffer in the
+  observation dtype (uint8 for Atari), so each step writes one frame in
+  place instead of re-stacking every frame.
+  """
+  def __init__(self, env, n_stack):
+    super().__init__(env)
+    self.n_stack = n_stack
+
+    obs_space = env.observation_space
+    self._frames = np.zeros((n_stack,) + obs_space.shape, dtype=obs_space.dtype)
+    self._frame_idx = 0 # Index of the oldest frame
+    self.observation_space = gym.spaces.Box(
+        low=np.repeat(obs_space.low[None], n_stack, axis=0),
+        high=np.repeat(obs_space.high[None], n_stack, axis=0),
+        dtype=obs_space.dtype)
+
+  def _get_obs(self):
+    # Oldest frame first, same as gym's FrameStack
+    return np.concatenate(
+      (self._frames[self._frame_idx:], self._frames[:self._frame_idx]))
+
+  def step(self, action):
+    obs, reward, done, info = self.env.step(action)
+    self._frames[self._frame_idx] = obs
+    self._frame_idx = (self._frame_idx + 1) % self.n_stack
+    return self._get_obs(), reward, done, info
+
+  def reset(self, **kwargs):
+    obs = self.env.reset(**kwargs)
+    self._frames[:] = obs
+    self._frame_idx = 0
+    return self._get_obs()
+
+class Uint8ToFloatTensorWrapper(gym.ObservationWrapper):
+  def __init__(self, env):
+    super().__init__(env)
+    self.observation_space = gym.spaces.Box(
+        low=0, high=1, shape=env.observation_space.shape, dtype=np.float32)
+
+  # Converts uint8 observations to float tensors in [0, 1]
+  def observation(self, observation):
+    return torch.from_numpy(observation).float().div_(255)
+
 class Custom2DWrapper(gym.Wrapper):
     def __init__(
         self,
@@ -174,8 +240,9 @@ class Custom2DWrapper(gym.Wrapper):
         
       # Convert to grayscale
       if self.grayscale_obs:
-        obs = np.sum(obs * np.array([[[0.2989, 0.5870, 0.1140]]]), axis=2,
-                     keepdims=self.grayscale_newaxis)
+        obs = rgb_to_grayscale(obs)
+        if self.grayscale_newaxis:
+          obs = np.expand_dims(obs, 2)
       obs = obs.transpose(2, 0, 1)
 
       # Rescale obs to [0, 1]
@@ -185,19 +252,20 @@ class Custom2DWrapper(gym.Wrapper):
       return obs
 
 
-ATARI_WRAPPERS = [
-  lambda env: AtariPreprocessing(env, scale_obs=True),
-  lambda env: FrameStack(env, N_FRAME_STACK),
-  lambda env: TransformObservation(env, torch.FloatTensor)
-]
+def apply_atari_wrappers(env, n_stack=N_FRAME_STACK, float_obs=True):
+  env = AtariPreprocessing(env, scale_obs=False)
+  env = FastFrameStack(env, n_stack)
+  if float_obs:
+    env = Uint8ToFloatTensorWrapper(env)
+  return env
 
-GYM_1D_WRAPPERS = [
-  lambda env: Scale1DObsWrapper(env),
-  lambda env: FrameStack(env, N_FRAME_STACK),
-  lambda env: TransformObservation(env, torch.FloatTensor)
-]
+def apply_gym_1d_wrappers(env, n_stack=N_FRAME_STACK):
+  env = Scale1DObsWrapper(env)
+  env = FastFrameStack(env, n_stack)
+  env = TransformObservation(env, torch.FloatTensor)
+  return env
 
-PROCGEN_WRAPPERS = [
-  lambda env: Custom2DWrapper(env),
-  lambda env: TransformObservation(env, torch.FloatTensor),
-]
\ No newline at end of file
+def apply_procgen_wrappers(env):
+  env = Custom2DWrapper(env)
+  env = TransformObservation(env, torch.FloatTensor)
+  return env
\ No newline at end of file
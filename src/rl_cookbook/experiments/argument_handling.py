@@ -11,7 +11,9 @@ def make_arg_parser():
     parser.add_argument('--exp_steps', type=int, default=int(1e5))
     parser.add_argument('--task_steps', type=int, default=int(1e5))
     parser.add_argument('--freeze_encoder', default=False, action='store_true')
+    parser.add_argument('--compile_models', default=False, action='store_true') # Requires torch >= 2.0
     parser.add_argument('--n_runs', type=int, default=1) # Does not work for sweeps
+    parser.add_argument('--wandb_offline', default=False, action='store_true') # Sync runs after all finish
     parser.add_argument('--reward_print_freq', type=int, default=5000)
 
     parser.add_argument('--exp_agent_args', type=str, metavar='KEY=VALUE', nargs='+', default={})
@@ -13,20 +13,20 @@ from ..agents.rainbow import RainbowAgent
 from ..agents.ppo import PPOAgent
 from ..agents.dqn import DDDQNAgent
 from ..agents.Rainbow import DEFAULT_RAINBOW_ARGS
-from ..models import SFNetwork, PolicyNetwork, CriticNetwork, StatePredictionModel
+from ..models import SFNetwork, PolicyNetwork, CriticNetwork, StatePredictionModel, compile_model
 
 
 REPR_LEARNERS = {
     'nextstatepredictor': lambda env, args:
         NextStatePredictor(
-            tracked(StatePredictionModel(list(env.observation_space.shape), env.action_space.n)) \
-                .to(args['device']),
+            compiled(tracked(StatePredictionModel(list(env.observation_space.shape), env.action_space.n)) \
+                .to(args['device']), args),
             env.action_space.n,
             **args['repr_agent_args']),
     'sfpredictor': lambda env, args:
         SFPredictor(
-            tracked(SFNetwork(list(env.observation_space.shape)),
-                **args['repr_model_args']).to(args['device']),
+            compiled(tracked(SFNetwork(list(env.observation_space.shape)),
+                **args['repr_model_args']).to(args['device']), args),
             **args['repr_agent_args']),
     'none': lambda _, __: None
 }
@@ -37,17 +37,17 @@ EXPLORATION_AGENTS = {
     'surprisal': lambda env, args, repr_learner:
         SurprisalExplorerAgent(
             env,
-            tracked(PolicyNetwork(list(env.observation_space.shape), env.action_space.n)) \
-                .to(args['device']),
-            tracked(CriticNetwork(list(env.observation_space.shape)).to(args['device'])),
+            compiled(tracked(PolicyNetwork(list(env.observation_space.shape), env.action_space.n)) \
+                .to(args['device']), args),
+            compiled(tracked(CriticNetwork(list(env.observation_space.shape)).to(args['device'])), args),
             repr_learner,
             **args['exp_agent_args']),
     'maxentropy': lambda env, args, repr_learner:
         MaxEntropyExplorerAgent(
             env,
-            tracked(PolicyNetwork(list(env.observation_space.shape), env.action_space.n)) \
-                .to(args['device']),
-            tracked(CriticNetwork(list(env.observation_space.shape)).to(args['device'])),
+            compiled(tracked(PolicyNetwork(list(env.observation_space.shape), env.action_space.n)) \
+                .to(args['device']), args),
+            compiled(tracked(CriticNetwork(list(env.observation_space.shape)).to(args['device'])), args),
             repr_learner,
             device = args['device'],
             **args['exp_agent_args'])
@@ -63,16 +63,16 @@ TASK_AGENTS = {
     'dddqn': lambda env, args, encoder, _:
         DDDQNAgent(
             env,
-            tracked(DDDQNNetwork(list(env.observation_space.shape), env.action_space.n,
-                encoder=copy.deepcopy(encoder))),
+            compiled(tracked(DDDQNNetwork(list(env.observation_space.shape), env.action_space.n,
+                encoder=copy.deepcopy(encoder))), args),
             **args['task_model_args']),
     'ppo': lambda env, args, encoder, _:
         PPOAgent(
             env,
-            tracked(PolicyNetwork(list(env.observation_space.shape), env.action_space.n,
-                encoder=copy.deepcopy(encoder) if encoder else None).to(args['device'])),
-            tracked(CriticNetwork(list(env.observation_space.shape),
-                encoder=copy.deepcopy(encoder) if encoder else None).to(args['device'])),
+            compiled(tracked(PolicyNetwork(list(env.observation_space.shape), env.action_space.n,
+                encoder=copy.deepcopy(encoder) if encoder else None).to(args['device'])), args),
+            compiled(tracked(CriticNetwork(list(env.observation_space.shape),
+                encoder=copy.deepcopy(encoder) if encoder else None).to(args['device'])), args),
             **args['task_model_args'])
 }
 
@@ -91,6 +91,11 @@ def dict_to_args(d):
 def tracked(model):
     wandb.watch(model)
     return model
+
+def compiled(model, args):
+    if args.get('compile_models'):
+        return compile_model(model)
+    return model
     
 def create_repr_learner(repr_learner_name: str, env: gym.Env, args: dict):
     return REPR_LEARNERS[repr_learner_name.lower()](env, args)
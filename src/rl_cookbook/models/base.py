@@ -10,6 +10,25 @@ class ReshapeLayer(nn.Module):
         batch_size = x.shape[0]
         return x.view(batch_size, *self.shape)
 
+class MemoryFormatLayer(nn.Module):
+    def __init__(self, memory_format):
+        super().__init__()
+        self.memory_format = memory_format
+
+    def forward(self, x):
+        return x.contiguous(memory_format=self.memory_format)
+
+# Conv stacks run in NHWC (channels last), the preferred layout for CPU
+# convs, and hand back standard contiguous outputs so callers can `view` them.
+# Only worth it for larger inputs like Atari frames, the two layout copies
+# cost more than they save on small gridworld maps
+def create_channels_last_convs(*layers):
+    convs = nn.Sequential(
+        MemoryFormatLayer(torch.channels_last),
+        *layers,
+        MemoryFormatLayer(torch.contiguous_format))
+    return convs.to(memory_format=torch.channels_last)
+
 def create_simple_1D_encoder(input_dim):
     flat_dim = input_dim[0] * input_dim[1]
     return nn.Sequential(
@@ -42,20 +61,78 @@ def create_gridworld_decoder(n_channels=1):
         nn.Conv2d(n_channels, n_channels, 3, 1, 1))
 
 def create_atari_encoder(n_channels=4):
-    return nn.Sequential(
+    return create_channels_last_convs(
         nn.Conv2d(n_channels, 32, 5, 5, 0),
         nn.ReLU(),
         nn.Conv2d(32, 64, 5, 5, 0),
         nn.ReLU())
 
 def create_atari_decoder(n_channels=4):
-    return nn.Sequential(
+    return create_channels_last_convs(
         nn.ConvTranspose2d(64, 32, 5, 5, 0),
         nn.ReLU(),
         nn.ConvTranspose2d(32, n_channels, 5, 5, 0),
         nn.ReLU(),
         nn.Conv2d(n_channels, n_channels, 3, 1, 1))
 
+# Layers that never change the shape of their input
+SHAPE_PRESERVING_LAYERS = (nn.ReLU, nn.LayerNorm, MemoryFormatLayer)
+
+def _conv_out_size(size, layer, dim):
+    kernel_size, stride = layer.kernel_size[dim], layer.stride[dim]
+    padding, dilation = layer.padding[dim], layer.dilation[dim]
+    if isinstance(layer, nn.ConvTranspose2d):
+        return (size - 1) * stride - 2 * padding + dilation * (kernel_size - 1) \
+            + layer.output_padding[dim] + 1
+    return (size + 2 * padding - dilation * (kernel_size - 1) - 1) // stride + 1
+
+def get_output_shape(module, input_shape):
+    """
+    Calculates the output shape (without the batch dimension) of a module
+    from its layer parameters, without running a forward pass. Falls back
+    to a forward pass on a test input for unrecognized layers.
+    """
+    shape = [1] + list(input_shape)
+    for layer in module.modules():
+        if isinstance(layer, (nn.Conv2d, nn.ConvTranspose2d)) \
+                and not isinstance(layer.padding, str):
+            shape = shape[:-3] + [layer.out_channels] \
+                + [_conv_out_size(shape[-2 + i], layer, i) for i in range(2)]
+        elif isinstance(layer, nn.Linear):
+            shape[-1] = layer.out_features
+        elif isinstance(layer, nn.Flatten):
+            start_dim = layer.start_dim % len(shape)
+            end_dim = layer.end_dim % len(shape)
+            flat_size = 1
+            for size in shape[start_dim:end_dim + 1]:
+                flat_size *= size
+            shape = shape[:start_dim] + [flat_size] + shape[end_dim + 1:]
+        elif isinstance(layer, ReshapeLayer):
+            shape = [1] + list(layer.shape)
+        elif len(list(layer.children())) == 0 \
+                and not isinstance(layer, SHAPE_PRESERVING_LAYERS):
+            test_input = torch.zeros(1, *input_shape)
+            with torch.no_grad():
+                return tuple(module(test_input).shape[1:])
+    return tuple(shape[1:])
+
+def get_output_size(module, input_shape):
+    output_size = 1
+    for size in get_output_shape(module, input_shape):
+        output_size *= size
+    return output_size
+
+def compile_model(model):
+    """
+    Compiles a model with `torch.compile` so small layer chains get fused.
+    Shapes are treated as static, so each new batch size triggers a
+    recompile. Returns the model unchanged on PyTorch versions without
+    `torch.compile` (< 2.0).
+    """
+    if hasattr(torch, 'compile'):
+        return torch.compile(model, dynamic=False)
+    return model
+
 GYM_HIDDEN_SIZE = 32
 GRIDWORLD_HIDDEN_SIZE = 64
 ATARI_HIDDEN_SIZE = 256
@@ -96,9 +173,7 @@ class PolicyNetwork(nn.Module):
         if encoder is None:
             encoder = create_encoder_from_obs_dim(obs_dim)
 
-        test_input = torch.zeros(1, *obs_dim)
-        with torch.no_grad():
-            self.encoder_output_size = encoder(test_input).view(-1).shape[0]
+        self.encoder_output_size = get_output_size(encoder, obs_dim)
 
         if not hidden_size:
             hidden_size = get_hidden_size_from_obs_dim(obs_dim)
@@ -118,9 +193,7 @@ class CriticNetwork(nn.Module):
         if encoder is None:
             encoder = create_encoder_from_obs_dim(obs_dim)
 
-        test_input = torch.zeros(1, *obs_dim)
-        with torch.no_grad():
-            self.encoder_output_size = encoder(test_input).view(-1).shape[0]
+        self.encoder_output_size = get_output_size(encoder, obs_dim)
 
         if not hidden_size:
             hidden_size = get_hidden_size_from_obs_dim(obs_dim)
@@ -141,43 +214,36 @@ class DDDQNNetwork(nn.Module):
             encoder = create_encoder_from_obs_dim(obs_dim)
         self.encoder = encoder
 
-        test_input = torch.zeros(1, *obs_dim)
-        with torch.no_grad():
-            self.encoder_output_size = encoder(test_input).view(-1).shape[0]
+        self.encoder_output_size = get_output_size(encoder, obs_dim)
 
         if not hidden_size:
             hidden_size = get_hidden_size_from_obs_dim(obs_dim)
-        self.value_layers = nn.Sequential(
+        # Value and advantage streams share one hidden layer
+        self.hidden_layers = nn.Sequential(
             nn.Flatten(),
             nn.Linear(self.encoder_output_size, hidden_size),
-            nn.ReLU(),
-            nn.Linear(hidden_size, 1))
-
-        self.advantage_layers = nn.Sequential(
-            nn.Flatten(),
-            nn.Linear(self.encoder_output_size, hidden_size),
-            nn.ReLU(),
-            nn.Linear(hidden_size, n_acts))
+            nn.ReLU())
+        self.value_head = nn.Linear(hidden_size, 1)
+        self.advantage_head = nn.Linear(hidden_size, n_acts)
 
         self._init_weights()
 
     def _init_weights(self):
-        self.value_layers[-1].weight.data.fill_(0)
-        self.value_layers[-1].bias.data.fill_(0)
-        self.advantage_layers[-1].weight.data.fill_(0)
-        self.advantage_layers[-1].bias.data.fill_(0)
+        self.value_head.weight.data.fill_(0)
+        self.value_head.bias.data.fill_(0)
+        self.advantage_head.weight.data.fill_(0)
+        self.advantage_head.bias.data.fill_(0)
 
     def forward(self, x):
-        z = self.encoder(x)
-        values = self.value_layers(z)
-        advantages = self.advantage_layers(z)
-
-        advantage_means = advantages.mean(dim=1, keepdim=True)
-        advantages = advantages - advantage_means
+        z = self.hidden_layers(self.encoder(x))
+        values = self.value_head(z)
+        advantages = self.advantage_head(z)
 
-        qs = values + advantages
+        # In place is safe, the advantage head output isn't needed for backward
+        advantages -= advantages.mean(dim=1, keepdim=True)
+        advantages += values
 
-        return qs
+        return advantages
 
 class SFNetwork(nn.Module):
     def __init__(self, obs_dim, embed_dim=256, encoder=None, hidden_size=None):
@@ -185,9 +251,7 @@ class SFNetwork(nn.Module):
         if encoder is None:
             encoder = create_encoder_from_obs_dim(obs_dim)
 
-        test_input = torch.zeros(1, *obs_dim)
-        with torch.no_grad():
-            self.encoder_output_size = encoder(test_input).view(-1).shape[0]
+        self.encoder_output_size = get_output_size(encoder, obs_dim)
         
         self.encoder = nn.Sequential(
             encoder,
@@ -214,8 +278,9 @@ class StatePredictionModel(nn.Module):
     super().__init__()
     self.downsample_convs = create_encoder_from_obs_dim(obs_dim)
 
-    test_input = torch.zeros([1] + list(obs_dim))
-    output_dim = self.downsample_convs(test_input).view(-1).shape[0]
+    # Fixed by obs_dim, so it is computed once instead of every forward
+    self.conv_out_shape = get_output_shape(self.downsample_convs, obs_dim)
+    output_dim = get_output_size(self.downsample_convs, obs_dim)
 
     if not hidden_size:
         hidden_size = get_hidden_size_from_obs_dim(obs_dim)
@@ -235,9 +300,9 @@ class StatePredictionModel(nn.Module):
 
   def forward(self, obs, acts):
     conv_out = self.downsample_convs(obs)
-    z = conv_out.view(obs.shape[0], -1)
+    z = conv_out.flatten(1)
     z = torch.cat([z, acts], dim=1)
     z = self.fc(z)
-    z = z.view(*list(conv_out.shape))
+    z = z.view(obs.shape[0], *self.conv_out_shape)
     out = self.upsample_convs(z)
     return out
\ No newline at end of file